@@ -4,6 +4,7 @@ import os
 import secrets
 import pathlib
 import datetime
+from typing import Dict, Optional
 import flask
 from flask import Flask
 from flask import jsonify
@@ -33,7 +34,9 @@ from sample_flow_server.model import (
 )
 
 
-def create_app(data_path: str = "/sample_flow_data"):
+def create_app(
+    data_path: str = "/sample_flow_data", test_config: Optional[Dict] = None
+):
     logger = get_logger("SampleFlowServer")
     app = Flask("SampleFlowServer")
     jwt_secret_key = os.environ.get("JWT_SECRET_KEY")
@@ -53,6 +56,9 @@ def create_app(data_path: str = "/sample_flow_data"):
     # limit max file upload size to 384mb
     app.config["MAX_CONTENT_LENGTH"] = 384 * 1024 * 1024
     app.config["CIRCUITSEQ_DATA_PATH"] = data_path
+    if test_config is not None:
+        # config overrides used by the tests, e.g. an in-memory database
+        app.config.update(test_config)
 
     CORS(app)
 
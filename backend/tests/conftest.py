@@ -1,7 +1,10 @@
 from __future__ import annotations
 import pytest
 from sample_flow_server import create_app
+from sample_flow_server.model import db
+from sqlalchemy.pool import StaticPool
 import shutil
+import datetime
 import flask
 import io
 import os
@@ -9,39 +12,106 @@ import sys
 import pathlib
 import smtplib
 
+# register the test modules for assert rewriting up front so the rewritten
+# .pyc files are cached and collection doesn't pay for lazy rewrites
+pytest.register_assert_rewrite("tests.test_app", "tests.test_model", "tests.test_utils")
+
 # add tests helpers package location to path so tests can import gui_test_utils
 sys.path.append(os.path.join(os.path.dirname(__file__), "helpers"))
 
 import flask_test_utils as ftu
 
 
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("JWT_SECRET_KEY", "abcdefghijklmnopqrstuvwxyz")
+        # production argon2 parameters are deliberately slow: use the same
+        # minimum-cost hasher as the test users for passwords set in tests
+        monkeypatch.setattr("sample_flow_server.model.ph", ftu.ph)
+        monkeypatch.setattr(
+            smtplib.SMTP,
+            "__init__",
+            lambda self, host: print(f"Monkeypatched SMTP host: {host}", flush=True),
+        )
+        monkeypatch.setattr(
+            smtplib.SMTP,
+            "send_message",
+            lambda self, msg: flask.current_app.config.update(
+                TESTING_ONLY_LAST_SMTP_MESSAGE=msg
+            ),
+        )
+        temp_data_path = str(tmp_path_factory.mktemp("db"))
+        # use a named shared-cache in-memory database so commits don't pay
+        # disk I/O costs; a StaticPool keeps a single connection open so the
+        # database persists for the lifetime of the app
+        app = create_app(
+            data_path=temp_data_path,
+            test_config={
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///file:{temp_data_path}/SampleFlow.db?mode=memory&cache=shared&uri=true",
+                "SQLALCHEMY_ENGINE_OPTIONS": {"poolclass": StaticPool},
+            },
+        )
+        # cached auth tokens can be created before a test time-travels to the
+        # past: allow a generous leeway when validating token timestamps so
+        # they remain valid there
+        app.config["JWT_DECODE_LEEWAY"] = datetime.timedelta(days=3650)
+        yield app
+
+
 @pytest.fixture()
-def app(monkeypatch, tmp_path):
-    monkeypatch.setenv("JWT_SECRET_KEY", "abcdefghijklmnopqrstuvwxyz")
-    monkeypatch.setattr(
-        smtplib.SMTP,
-        "__init__",
-        lambda self, host: print(f"Monkeypatched SMTP host: {host}", flush=True),
-    )
-    monkeypatch.setattr(
-        smtplib.SMTP,
-        "send_message",
-        lambda self, msg: flask.current_app.config.update(
-            TESTING_ONLY_LAST_SMTP_MESSAGE=msg
-        ),
-    )
-    temp_data_path = str(tmp_path)
-    app = create_app(data_path=temp_data_path)
+def data_path(tmp_path) -> pathlib.Path:
+    # the data path the app is pointed at for the current test
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def _reset_app(app, data_path):
+    # instead of creating a new app for every test, the session-scoped app is
+    # given a fresh data path and a freshly seeded database: wiping the table
+    # contents is much cheaper than recreating app, schema & JWT manager
+    app.config["CIRCUITSEQ_DATA_PATH"] = str(data_path)
+    app.config.pop("TESTING_ONLY_LAST_SMTP_MESSAGE", None)
+    with app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
     ftu.add_test_users(app)
-    ftu.add_test_samples(app, tmp_path)
-    yield app
+    ftu.add_test_samples(app, data_path)
 
 
-@pytest.fixture()
+@pytest.fixture(scope="session")
 def client(app):
     return app.test_client()
 
 
+def _login_headers(client, email: str, password: str) -> dict:
+    response = client.post("/api/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {response.json['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def _auth_token_cache() -> dict:
+    # the app fixture always uses the same JWT secret key and test users, so
+    # tokens remain valid across app instances and each login (which involves
+    # an intentionally slow argon2 password verify) only needs to happen once
+    return {}
+
+
+@pytest.fixture()
+def user_headers(client, _auth_token_cache) -> dict:
+    if "user" not in _auth_token_cache:
+        _auth_token_cache["user"] = _login_headers(client, "user@embl.de", "user")
+    return _auth_token_cache["user"]
+
+
+@pytest.fixture()
+def admin_headers(client, _auth_token_cache) -> dict:
+    if "admin" not in _auth_token_cache:
+        _auth_token_cache["admin"] = _login_headers(client, "admin@embl.de", "admin")
+    return _auth_token_cache["admin"]
+
+
 @pytest.fixture()
 def result_zipfile(tmp_path) -> pathlib.Path:
     # make a results zip file with files a.txt, b.txt, c.txt, email.txt
@@ -61,10 +131,10 @@ def result_zipfile(tmp_path) -> pathlib.Path:
     yield result_zipfile
 
 
-@pytest.fixture()
-def ref_seq_embl() -> io.BytesIO:
+@pytest.fixture(scope="session")
+def _ref_seq_embl_bytes() -> bytes:
     # http://scikit-bio.org/docs/0.5.3/generated/skbio.io.format.embl.html
-    embl_str = b"""
+    return b"""
 ID   X56734; SV 1; linear; mRNA; STD; PLN; 1859 BP.
 XX
 AC   X56734; S46826;
@@ -171,25 +241,33 @@ SQ   Sequence 1859 BP; 609 A; 314 C; 355 G; 581 T; 0 other;
      tttgaattaa aagtcttttt ttattttttt aaaaaaaaaa aaaaaaaaaa aaaaaaaaa
 //
 """
-    return io.BytesIO(embl_str)
 
 
 @pytest.fixture()
-def ref_seq_fasta() -> io.BytesIO:
+def ref_seq_embl(_ref_seq_embl_bytes) -> io.BytesIO:
+    return io.BytesIO(_ref_seq_embl_bytes)
+
+
+@pytest.fixture(scope="session")
+def _ref_seq_fasta_bytes() -> bytes:
     # http://prodata.swmed.edu/promals/info/fasta_format_file_example.htm
-    fasta_str = b"""
+    return b"""
 >seq0
 FQTWEEFSRAAEKLYLADPMKVRVVLKYRHVDGNLCIKVTDDLVCLVYRTDQAQDVKKIEKF
 >seq1
 KYRTWEEFTRAAEKLYQADPMKVRVVLKYRHCDGNLCIKVTDDVVCLLYRTDQAQDVKKIEKFHSQLMRLME LKVTDNKECLKFKTDQAQEAKKMEKLNNIFFTLM
 """
-    return io.BytesIO(fasta_str)
 
 
 @pytest.fixture()
-def ref_seq_genbank() -> io.BytesIO:
+def ref_seq_fasta(_ref_seq_fasta_bytes) -> io.BytesIO:
+    return io.BytesIO(_ref_seq_fasta_bytes)
+
+
+@pytest.fixture(scope="session")
+def _ref_seq_genbank_bytes() -> bytes:
     # https://raw.githubusercontent.com/biopython/biopython/master/Doc/examples/ls_orchid.gbk
-    gbk_str = b"""
+    return b"""
 LOCUS       Z78533                   740 bp    DNA     linear   PLN 30-NOV-2006
 DEFINITION  C.irapeanum 5.8S rRNA gene and ITS1 and ITS2 DNA.
 ACCESSION   Z78533
@@ -291,4 +369,8 @@ ORIGIN
       721 caggtcaggc ggggccaccc gctgagttga ggc
 //
 """
-    return io.BytesIO(gbk_str)
+
+
+@pytest.fixture()
+def ref_seq_genbank(_ref_seq_genbank_bytes) -> io.BytesIO:
+    return io.BytesIO(_ref_seq_genbank_bytes)
@@ -5,9 +5,20 @@ import pathlib
 import shutil
 import tempfile
 
+# minimum-cost hashing parameters: hashing speed rather than hash strength
+# is what matters in the tests
+ph = argon2.PasswordHasher(time_cost=1, memory_cost=8, parallelism=1)
+_password_hashes = {}
+
+
+def _password_hash(password: str) -> str:
+    # cache the hash so each password is only hashed once per test session
+    if password not in _password_hashes:
+        _password_hashes[password] = ph.hash(password)
+    return _password_hashes[password]
+
 
 def add_test_users(app):
-    ph = argon2.PasswordHasher()
     with app.app_context():
         # add users for tests
         for name, is_admin in [("admin", True), ("user", False)]:
@@ -15,7 +26,7 @@ def add_test_users(app):
             db.session.add(
                 User(
                     email=email,
-                    password_hash=ph.hash(name),
+                    password_hash=_password_hash(name),
                     activated=True,
                     is_admin=is_admin,
                 )
@@ -1,20 +1,21 @@
 from __future__ import annotations
 from typing import Dict
 import io
+import pytest
 import zipfile
-from freezegun import freeze_time
+import time_machine
 import pathlib
 import sample_flow_server
 import flask_test_utils as ftu
 
 
-@freeze_time("2022-11-21")
+@time_machine.travel("2022-11-21", tick=False)
 def test_remaining_mon(client):
     response = client.get("/api/remaining")
     assert response.json["remaining"] == 96
 
 
-@freeze_time("2022-11-19")
+@time_machine.travel("2022-11-19", tick=False)
 def test_remaining_sat(client):
     response = client.get("/api/remaining")
     assert response.json["remaining"] == 0
@@ -52,8 +53,8 @@ def test_login_valid(client):
     assert response.json["user"]["is_admin"] is False
 
 
-def test_change_password_invalid(client):
-    headers = _get_auth_headers(client)
+def test_change_password_invalid(client, user_headers):
+    headers = user_headers
     response = client.post(
         "/api/login", json={"email": "user@embl.de", "password": "user"}
     )
@@ -77,8 +78,8 @@ def test_change_password_invalid(client):
     assert response.json["message"] == "New password missing"
 
 
-def test_change_password_valid(client):
-    headers = _get_auth_headers(client)
+def test_change_password_valid(client, user_headers):
+    headers = user_headers
     response = client.post(
         "/api/login", json={"email": "user@embl.de", "password": "user"}
     )
@@ -135,15 +136,14 @@ def test_samples_invalid(client):
     assert response.status_code == 401
 
 
-def test_samples_valid(client):
-    headers = _get_auth_headers(client)
-    response = client.get("/api/samples", headers=headers)
+def test_samples_valid(client, user_headers):
+    response = client.get("/api/samples", headers=user_headers)
     assert response.status_code == 200
     assert "current_samples" in response.json
     assert "previous_samples" in response.json
 
 
-def test_reference_sequence_invalid(client):
+def test_reference_sequence_invalid(client, user_headers):
     # no auth header
     response = client.post(
         "/api/reference_sequence",
@@ -151,22 +151,20 @@ def test_reference_sequence_invalid(client):
     )
     assert response.status_code == 401
     # invalid primary key
-    headers = _get_auth_headers(client)
     response = client.post(
         "/api/reference_sequence",
         json={"primary_key": "22_99_A1"},
-        headers=headers,
+        headers=user_headers,
     )
     assert response.status_code == 400
     assert "not found" in response.json["message"]
 
 
-def test_reference_sequence_valid(client):
-    headers = _get_auth_headers(client)
+def test_reference_sequence_valid(client, user_headers):
     response = client.post(
         "/api/reference_sequence",
         json={"primary_key": "22_46_A1"},
-        headers=headers,
+        headers=user_headers,
     )
     assert response.status_code == 200
     zip_file = zipfile.ZipFile(io.BytesIO(response.data))
@@ -181,25 +179,34 @@ def test_running_options_invalid(client):
     assert response.status_code == 401
 
 
-def test_running_options_valid(client):
-    headers = _get_auth_headers(client)
-    response = client.get("/api/running_options", headers=headers)
+def test_running_options_valid(client, user_headers):
+    response = client.get("/api/running_options", headers=user_headers)
     assert response.status_code == 200
     assert "running_options" in response.json
 
 
-@freeze_time("2022-11-21")
-def test_sample_mon_fasta(client, ref_seq_fasta):
-    headers = _get_auth_headers(client)
+@pytest.mark.parametrize(
+    "ref_seq_fixture,filename",
+    [
+        ("ref_seq_fasta", "test.fa"),
+        ("ref_seq_embl", "test.embl"),
+        ("ref_seq_genbank", "test.gbk"),
+    ],
+)
+@time_machine.travel("2022-11-21", tick=False)
+def test_sample_mon_single_file(
+    client, user_headers, data_path, request, ref_seq_fixture, filename
+):
+    ref_seq = request.getfixturevalue(ref_seq_fixture)
     response = client.post(
         "/api/sample",
         data={
             "name": "abc",
             "running_option": "r Q",
             "concentration": 97,
-            "file": (ref_seq_fasta, "test.fa"),
+            "file": (ref_seq, filename),
         },
-        headers=headers,
+        headers=user_headers,
     )
     assert response.status_code == 200
     new_sample = response.json["sample"]
@@ -210,17 +217,17 @@ def test_sample_mon_fasta(client, ref_seq_fasta):
     assert new_sample["has_results_zip"] is False
     assert new_sample["running_option"] == "r Q"
     assert new_sample["concentration"] == 97
-    data_path = pathlib.Path(client.application.config.get("CIRCUITSEQ_DATA_PATH"))
     zip_path = data_path / "2022/47/inputs/references/22_47_A1_abc.zip"
     assert zip_path.is_file()
     zip_file = zipfile.ZipFile(zip_path)
     assert len(zip_file.namelist()) == 1
-    assert "test.fa" in zip_file.namelist()
+    assert filename in zip_file.namelist()
 
 
-@freeze_time("2022-11-21")
-def test_sample_mon_three_files(client, ref_seq_fasta, ref_seq_embl, ref_seq_genbank):
-    headers = _get_auth_headers(client)
+@time_machine.travel("2022-11-21", tick=False)
+def test_sample_mon_three_files(
+    client, user_headers, data_path, ref_seq_fasta, ref_seq_embl, ref_seq_genbank
+):
     response = client.post(
         "/api/sample",
         data={
@@ -233,7 +240,7 @@ def test_sample_mon_three_files(client, ref_seq_fasta, ref_seq_embl, ref_seq_gen
                 (ref_seq_fasta, "test.fa"),
             ],
         },
-        headers=headers,
+        headers=user_headers,
     )
     assert response.status_code == 200
     new_sample = response.json["sample"]
@@ -244,7 +251,6 @@ def test_sample_mon_three_files(client, ref_seq_fasta, ref_seq_embl, ref_seq_gen
     assert new_sample["has_results_zip"] is False
     assert new_sample["running_option"] == "r23"
     assert new_sample["concentration"] == 11
-    data_path = pathlib.Path(client.application.config.get("CIRCUITSEQ_DATA_PATH"))
     zip_path = data_path / "2022/47/inputs/references/22_47_A1_abc.zip"
     assert zip_path.is_file()
     zip_file = zipfile.ZipFile(zip_path)
@@ -254,25 +260,27 @@ def test_sample_mon_three_files(client, ref_seq_fasta, ref_seq_embl, ref_seq_gen
     assert "test.embl" in zip_file.namelist()
 
 
-def test_result_invalid(client):
+def test_result_invalid(client, user_headers):
     response = client.post("/api/result", json={"primary_key": "XYZ"})
     assert response.status_code == 401
-    headers = _get_auth_headers(client, "user@embl.de", "user")
-    response = client.post("/api/result", json={"primary_key": "XYZ"}, headers=headers)
+    response = client.post(
+        "/api/result", json={"primary_key": "XYZ"}, headers=user_headers
+    )
     assert response.status_code == 400
     assert f"Sample not found" in response.json["message"]
     key = "22_46_A2"
     response = client.post(
         "/api/result",
         json={"primary_key": key},
-        headers=headers,
+        headers=user_headers,
     )
     assert response.status_code == 400
     assert f"No results available" in response.json["message"]
 
 
-def _upload_result(client, result_zipfile: pathlib.Path, primary_key: str):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
+def _upload_result(
+    client, headers: Dict, result_zipfile: pathlib.Path, primary_key: str
+):
     with open(result_zipfile, "rb") as f:
         response = client.post(
             "/api/admin/result",
@@ -286,31 +294,39 @@ def _upload_result(client, result_zipfile: pathlib.Path, primary_key: str):
     return response
 
 
-def test_result_valid(client, result_zipfile):
-    headers = _get_auth_headers(client, "user@embl.de", "user")
+def test_result_valid(client, user_headers, admin_headers, result_zipfile):
     key = "22_46_A2"
-    assert _upload_result(client, result_zipfile, key).status_code == 200
+    assert _upload_result(client, admin_headers, result_zipfile, key).status_code == 200
     response = client.post(
         "/api/result",
         json={"primary_key": key},
-        headers=headers,
+        headers=user_headers,
     )
     assert response.status_code == 200
     assert len(response.data) > 1
 
 
-def test_admin_settings_invalid(client):
+@pytest.mark.parametrize(
+    "method,endpoint",
+    [
+        ("GET", "/api/admin/settings"),
+        ("GET", "/api/admin/samples"),
+        ("GET", "/api/admin/token"),
+        ("GET", "/api/admin/users"),
+        ("POST", "/api/admin/zipsamples"),
+    ],
+)
+def test_admin_endpoint_requires_admin_user(client, user_headers, method, endpoint):
     # no auth header
-    response = client.get("/api/admin/settings")
+    response = client.open(endpoint, method=method)
     assert response.status_code == 401
     # valid non-admin user auth header
-    headers = _get_auth_headers(client)
-    response = client.get("/api/admin/settings", headers=headers)
+    response = client.open(endpoint, method=method, headers=user_headers)
     assert response.status_code == 400
 
 
-def test_admin_settings_valid(client):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
+def test_admin_settings_valid(client, admin_headers):
+    headers = admin_headers
     response = client.get("/api/admin/settings", headers=headers)
     assert response.status_code == 200
     assert response.json["plate_n_rows"] == 8
@@ -335,37 +351,15 @@ def test_admin_settings_valid(client):
     assert response.json["last_submission_day"] == 4
 
 
-def test_admin_samples_invalid(client):
-    # no auth header
-    response = client.get("/api/admin/samples")
-    assert response.status_code == 401
-    # valid non-admin user auth header
-    headers = _get_auth_headers(client)
-    response = client.get("/api/admin/samples", headers=headers)
-    assert response.status_code == 400
-
-
-def test_admin_samples_valid(client):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
-    response = client.get("/api/admin/samples", headers=headers)
+def test_admin_samples_valid(client, admin_headers):
+    response = client.get("/api/admin/samples", headers=admin_headers)
     assert response.status_code == 200
     assert "current_samples" in response.json
     assert "previous_samples" in response.json
 
 
-def test_admin_token_invalid(client):
-    # no auth header
-    response = client.get("/api/admin/token")
-    assert response.status_code == 401
-    # valid non-admin user auth header
-    headers = _get_auth_headers(client)
-    response = client.get("/api/admin/token", headers=headers)
-    assert response.status_code == 400
-
-
-def test_admin_token_valid(client):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
-    response = client.get("/api/admin/token", headers=headers)
+def test_admin_token_valid(client, admin_headers):
+    response = client.get("/api/admin/token", headers=admin_headers)
     assert response.status_code == 200
     new_token = response.json["access_token"]
     assert (
@@ -376,36 +370,15 @@ def test_admin_token_valid(client):
     )
 
 
-def test_admin_users_invalid(client):
-    # no auth header
-    response = client.get("/api/admin/users")
-    assert response.status_code == 401
-    # valid non-admin user auth header
-    headers = _get_auth_headers(client)
-    response = client.get("/api/admin/users", headers=headers)
-    assert response.status_code == 400
-
-
-def test_admin_users_valid(client):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
-    response = client.get("/api/admin/users", headers=headers)
+def test_admin_users_valid(client, admin_headers):
+    response = client.get("/api/admin/users", headers=admin_headers)
     assert response.status_code == 200
     assert "users" in response.json
 
 
-def test_admin_zipsamples_invalid(client):
-    # no auth header
-    response = client.post("/api/admin/zipsamples")
-    assert response.status_code == 401
-    # valid non-admin user auth header
-    headers = _get_auth_headers(client)
-    response = client.post("/api/admin/zipsamples", headers=headers)
-    assert response.status_code == 400
-
-
-@freeze_time("2022-11-21")
-def test_admin_zipsamples_valid(client, ref_seq_fasta):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
+@time_machine.travel("2022-11-21", tick=False)
+def test_admin_zipsamples_valid(client, admin_headers, ref_seq_fasta):
+    headers = admin_headers
     # upload a sample
     response = client.post(
         "/api/sample",
@@ -427,26 +400,28 @@ def test_admin_zipsamples_valid(client, ref_seq_fasta):
     assert "samples.tsv" in filenames
     assert "references/" in filenames
     assert "references/22_47_A1_abc.zip" in filenames
-    tsv_lines = zip_file.read("samples.tsv").splitlines()
-    assert len(tsv_lines) == 2
-    assert (
-        tsv_lines[0]
-        == b"date\tprimary_key\ttube_primary_key\temail\tname\trunning_option\tconcentration"
-    )
-    assert (
-        tsv_lines[1] == b"2022-11-21\t22_47_A1\t22_47_A1\tadmin@embl.de\tabc\tr Q\t97"
-    )
+    # stream the tsv line by line instead of reading it all into memory
+    with zip_file.open("samples.tsv") as tsv_file:
+        assert (
+            tsv_file.readline().rstrip(b"\n")
+            == b"date\tprimary_key\ttube_primary_key\temail\tname\trunning_option\tconcentration"
+        )
+        assert (
+            tsv_file.readline().rstrip(b"\n")
+            == b"2022-11-21\t22_47_A1\t22_47_A1\tadmin@embl.de\tabc\tr Q\t97"
+        )
+        assert tsv_file.readline() == b""
 
 
-def test_admin_result_valid(client, result_zipfile):
-    response = _upload_result(client, result_zipfile, "22_46_A2")
+def test_admin_result_valid(client, admin_headers, result_zipfile):
+    response = _upload_result(client, admin_headers, result_zipfile, "22_46_A2")
     assert response.status_code == 200
     assert "file saved" in response.json["message"]
 
 
-@freeze_time("2022-11-21")
-def test_admin_resubmit_sample_valid(client, result_zipfile):
-    headers = _get_auth_headers(client, "admin@embl.de", "admin")
+@time_machine.travel("2022-11-21", tick=False)
+def test_admin_resubmit_sample_valid(client, admin_headers, result_zipfile):
+    headers = admin_headers
     primary_key = "22_46_A2"
     new_primary_key = "22_47_A1"
     response = client.post(
@@ -472,6 +447,6 @@ def test_admin_resubmit_sample_valid(client, result_zipfile):
         if key not in keys_that_should_differ:
             assert value == resubmitted_sample[key]
     # uploading a result for new primary key -> original primary key
-    response = _upload_result(client, result_zipfile, "22_47_A1")
+    response = _upload_result(client, admin_headers, result_zipfile, "22_47_A1")
     assert response.status_code == 200
     assert primary_key in response.json["message"]